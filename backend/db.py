@@ -1,33 +1,62 @@
 """
-Database connection helper.
+Database connection helper for sync code (CLI scripts such as `import.py`).
 
-This module centralizes how connections are created. Right now we use
-`psycopg.connect(settings.db_url)` which opens a new connection per call.
+This module centralizes how sync connections are created. We keep one
+process-wide `psycopg_pool.ConnectionPool` (`POOL`) and hand out pooled
+connections, so repeated `get_conn()` calls don't each pay a TCP + auth
+handshake. The FastAPI app uses the async pool in `db_async.py` instead.
 
 Why this exists:
 - Single place to swap connection strategy (pooling, async driver, etc.).
 - Keeps repository code focused on SQL and row mapping.
 
 Usage:
-    from db import get_conn
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT 1;")
-
-Note: switching to a connection pool or async DB driver will change the
-`get_conn()` implementation — repository code should remain unchanged.
+    from db import get_conn, close_pool
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+    finally:
+        close_pool()
+
+Leaving the `with` block commits (or rolls back on error) and returns the
+connection to the pool instead of closing it. The pool opens on the first
+`get_conn()` call, so importing this module connects to nothing; callers
+that used it call `close_pool()` before exiting. For further
+multiplexing, the pool can sit in front of PgBouncer in transaction
+pooling mode without changes here.
 """
 
-import psycopg
+from psycopg_pool import ConnectionPool
 from settings import settings
 
 
+# Opened lazily by `get_conn()`. Scripts mostly hold one connection at a
+# time, so only one is kept warm. `timeout` bounds how long a caller waits
+# for a free connection, and `connect_timeout` keeps callers from hanging
+# if the DB is unreachable.
+POOL = ConnectionPool(
+    settings.db_url,
+    min_size=1,
+    max_size=20,
+    timeout=5,
+    kwargs={"connect_timeout": 5},
+    open=False,
+)
+
+
 def get_conn():
-    """Return a new psycopg connection using `settings.db_url`.
+    """Return a pooled connection context manager, opening `POOL` if needed.
 
-    We add a short `connect_timeout` so HTTP requests don't hang
-    indefinitely if the database is unreachable. Adjust the timeout
-    as needed for your environment or replace with a pool.
+    Use it as `with get_conn() as conn:`; the connection goes back to
+    `POOL` when the block exits.
     """
 
-    return psycopg.connect(settings.db_url, connect_timeout=5)
+    POOL.open()
+    return POOL.connection()
+
+
+def close_pool() -> None:
+    """Close `POOL` and its connections; call once before the process exits."""
+
+    POOL.close()
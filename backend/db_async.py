@@ -0,0 +1,55 @@
+"""
+Async database connection helper for the FastAPI app.
+
+The HTTP routes are `async def`, so the repository talks to Postgres via
+psycopg's async API through a process-wide `AsyncConnectionPool`
+(`POOL`). One event-loop thread multiplexes many in-flight queries
+instead of parking a threadpool worker per request.
+
+`db.py` keeps the sync pool for CLI scripts (e.g. `import.py`).
+
+Usage:
+    from db_async import get_async_conn
+    async with get_async_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT 1;")
+
+The pool needs a running event loop to open, so the app calls
+`open_pool()` on startup and `close_pool()` on shutdown.
+"""
+
+from psycopg_pool import AsyncConnectionPool
+from settings import settings
+
+
+POOL = AsyncConnectionPool(
+    settings.db_url,
+    min_size=4,
+    max_size=20,
+    timeout=5,
+    kwargs={"connect_timeout": 5},
+    open=False,
+)
+
+
+async def open_pool() -> None:
+    """Open `POOL`; call once from the app's startup hook."""
+
+    await POOL.open()
+
+
+async def close_pool() -> None:
+    """Close `POOL`; call once from the app's shutdown hook."""
+
+    await POOL.close()
+
+
+def get_async_conn(timeout: float | None = None):
+    """Return a pooled async connection context manager.
+
+    Use it as `async with get_async_conn() as conn:`; the connection goes
+    back to `POOL` when the block exits. `timeout` overrides how long to
+    wait for a free connection (defaults to the pool's `timeout`).
+    """
+
+    return POOL.connection(timeout=timeout)
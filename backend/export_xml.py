@@ -0,0 +1,52 @@
+"""
+Streaming reader for Apple Health `export.xml`.
+
+Exports run to multiple GB, so we never build an element tree: expat
+calls `on_start(name, attrs)` for every start tag and nothing survives
+the callback. Everything the importers need lives on start-tag
+attributes.
+
+The file is memory-mapped and fed to expat in `CHUNK_SIZE` slices, so
+the kernel pages it in on demand (with sequential readahead where the
+platform supports it) rather than Python `read()` calls copying it
+through intermediate buffers.
+
+Usage:
+    from export_xml import parse_export
+
+    def on_start(name, attrs):
+        if name == "Record":
+            ...
+
+    parse_export("export.xml", on_start)
+"""
+
+import mmap
+from xml.parsers import expat
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def parse_export(path: str, on_start, names=()) -> None:
+    """Parse `path`, calling `on_start(name, attrs)` for each start tag.
+
+    `names` seeds expat's name-intern table: tag and attribute names
+    equal to one of them are passed to `on_start` as that very object,
+    so callers comparing against the same constants hit the identity
+    fast path. Exceptions raised by `on_start` stop the parse and
+    propagate.
+    """
+
+    parser = expat.ParserCreate(intern={name: name for name in names})
+    parser.StartElementHandler = on_start
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # madvise isn't available on every platform (e.g. Windows)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mm) as view:
+            for offset in range(0, len(view), CHUNK_SIZE):
+                parser.Parse(view[offset:offset + CHUNK_SIZE], False)
+
+    parser.Parse(b"", True)
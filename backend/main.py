@@ -1,15 +1,39 @@
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from typing import List
 from datetime import datetime, timedelta, timezone
-import random
 
+import msgspec
+import orjson
+
+from db_async import open_pool, close_pool
 from models import EventIn
 from repo_events import EventRepo
 from service_events import EventService
 from settings import settings
 
-app = FastAPI(title="PulseContext Backend")
+class ORJSONResponse(JSONResponse):
+    """Default JSON response, rendered with orjson instead of stdlib json."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The async pool must be opened inside the running event loop.
+    await open_pool()
+    yield
+    # Release pooled DB connections when the server stops.
+    await close_pool()
+
+
+app = FastAPI(
+    title="PulseContext Backend",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Instantiate the repo + service here so the routes remain thin and
 # replaceable for testing. A future enhancement could inject mocks in
@@ -17,18 +41,50 @@ app = FastAPI(title="PulseContext Backend")
 repo = EventRepo()
 svc = EventService(repo)
 
+# Decode + validate `/ingest` bodies with msgspec in one C pass instead of
+# FastAPI's per-item Pydantic validation.
+events_decoder = msgspec.json.Decoder(List[EventIn])
+
 @app.get("/health")
-def health():
+async def health():
     try:
-        svc.health_check()
+        await svc.health_check()
         return {"ok": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB health check failed: {e}")
 
+async def read_body_limited(request: Request, limit: int) -> bytearray:
+    """Read the request body, failing with 413 once it exceeds `limit` bytes.
+
+    A declared Content-Length is checked up front; chunked bodies are
+    counted as they stream in, so nothing past `limit` is buffered.
+    """
+
+    too_large = HTTPException(status_code=413, detail=f"Request body too large (max {limit} bytes)")
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > limit:
+        raise too_large
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    return body
+
 @app.post("/ingest")
-def ingest(events: List[EventIn]):
+async def ingest(request: Request):
+    # Bound memory before decoding: `MAX_REQUEST_SIZE` is only checked on
+    # decoded events, which would already be resident by then.
+    body = await read_body_limited(request, settings.max_request_bytes)
     try:
-        inserted = svc.ingest_events(events, caller_user=None)  # later: auth user here
+        events = events_decoder.decode(body)
+    except msgspec.DecodeError as e:
+        # Same status FastAPI uses for body validation errors
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        inserted = await svc.ingest_events(events, caller_user=None)  # later: auth user here
         return {"inserted": inserted}
     except PermissionError as e:
         raise HTTPException(status_code=403, detail=str(e))
@@ -38,50 +94,21 @@ def ingest(events: List[EventIn]):
         raise HTTPException(status_code=500, detail=f"Insert failed: {e}")
 
 @app.get("/timeline")
-def timeline(user_id: str = Query(...), limit: int = 200):
+async def timeline(user_id: str = Query(...), limit: int = 200):
     try:
-        return svc.get_timeline(user_id, limit)
+        # Already-encoded JSON; skip FastAPI's response serialization
+        body = await svc.get_timeline_json(user_id, limit)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Timeline failed: {e}")
 
 @app.post("/seed")
-def seed(user_id: str = settings.default_user, days_ago: int = 0):
+async def seed(user_id: str = settings.default_user, days_ago: int = 0):
     now = datetime.now(timezone.utc) - timedelta(days=days_ago)
     start = now.replace(hour=6, minute=0, second=0, microsecond=0)
 
-    events: List[EventIn] = []
-    ts = start
-
-    for _ in range(200):
-        hour = ts.hour
-        if 8 <= hour <= 9:
-            motion = random.choice(["walking", "automotive"])
-            hr = random.randint(95, 120)
-            place = "commute"
-        elif 10 <= hour <= 17:
-            motion = random.choice(["sedentary", "walking"])
-            hr = random.randint(65, 90)
-            place = "work"
-        elif 18 <= hour <= 19:
-            motion = random.choice(["workout", "walking"])
-            hr = random.randint(110, 155)
-            place = "gym"
-        else:
-            motion = random.choice(["sedentary", "walking"])
-            hr = random.randint(60, 85)
-            place = "home"
-
-        events.append(EventIn(
-            user_id=user_id,
-            ts=ts,
-            type="context_snapshot",
-            source="simulator",
-            payload={"motion": motion, "heart_rate": hr, "place": place, "v": 1},
-        ))
-        ts += timedelta(minutes=5)
-
     # NOTE: call the facade/service, NOT the raw repo
-    inserted = svc.ingest_events(events, caller_user=None)
+    inserted = await svc.seed_demo_events(user_id, start)
     return {"inserted": inserted}
 
 @app.get("/ui", response_class=HTMLResponse)
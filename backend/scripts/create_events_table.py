@@ -12,6 +12,14 @@ CREATE TABLE IF NOT EXISTS events (
 );
 
 CREATE INDEX IF NOT EXISTS idx_events_user_ts ON events (user_id, ts DESC);
+
+-- events is append-mostly in ts order, so a BRIN index stays tiny and
+-- still prunes range scans for time-bucketed aggregates
+CREATE INDEX IF NOT EXISTS idx_events_ts_brin ON events USING BRIN (ts) WITH (pages_per_range = 32);
+
+-- Partial index covering the Apple Health import rows; lets
+-- scripts/count_imported.py count them with an index-only scan
+CREATE INDEX IF NOT EXISTS idx_events_source_apple ON events (ts) WHERE source = 'apple_health_export';
 '''
 
 print('Connecting to', settings.db_url)
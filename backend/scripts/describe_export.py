@@ -1,14 +1,23 @@
 from collections import Counter
 from datetime import datetime
-import xml.etree.ElementTree as ET
 import sys
 import os
 
+import ciso8601
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
+
+from export_xml import parse_export
+
 EXPORT = sys.argv[1] if len(sys.argv) > 1 else r"C:\projects\pulsecontext\export.xml"
 
 def parse_date(s: str):
     try:
-        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S %z")
+        # "2025-02-10 08:45:23 -0500" -> "2025-02-10 08:45:23-0500" for ciso8601;
+        # other ISO-8601 forms (e.g. "...T08:45:23Z") are parsed as given
+        if s[19:20] == " ":
+            return ciso8601.parse_datetime(s[:19] + s[20:])
+        return ciso8601.parse_datetime(s)
     except Exception:
         try:
             return datetime.fromisoformat(s)
@@ -27,17 +36,17 @@ max_date = None
 min_workout = None
 max_workout = None
 
-# stream parse
-for event, elem in ET.iterparse(EXPORT, events=("end",)):
-    tag = elem.tag
+def on_start(tag, attrs):
+    global rec_count, workout_count, min_date, max_date, min_workout, max_workout
+
     if tag == 'Record':
         rec_count += 1
-        t = elem.attrib.get('type')
+        t = attrs.get('type')
         record_type_counts[t] += 1
-        src = elem.attrib.get('sourceName') or elem.attrib.get('source')
+        src = attrs.get('sourceName') or attrs.get('source')
         if src:
             source_counts[src] += 1
-        sd = elem.attrib.get('startDate')
+        sd = attrs.get('startDate')
         if sd:
             d = parse_date(sd)
             if d:
@@ -47,8 +56,8 @@ for event, elem in ET.iterparse(EXPORT, events=("end",)):
                     max_date = d
     elif tag == 'Workout':
         workout_count += 1
-        sd = elem.attrib.get('startDate')
-        ed = elem.attrib.get('endDate')
+        sd = attrs.get('startDate')
+        ed = attrs.get('endDate')
         if sd:
             d = parse_date(sd)
             if d:
@@ -63,8 +72,10 @@ for event, elem in ET.iterparse(EXPORT, events=("end",)):
                     min_workout = d2
                 if max_workout is None or d2 > max_workout:
                     max_workout = d2
-    # clear to keep memory low
-    elem.clear()
+
+# stream parse: only start tags are handled, so no Element objects are
+# built and memory stays flat
+parse_export(EXPORT, on_start)
 
 print('\nTotals:')
 print('  Record elements:', rec_count)
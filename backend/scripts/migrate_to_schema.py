@@ -13,21 +13,53 @@ Prerequisites:
 
 import sys
 import os
-import xml.etree.ElementTree as ET
+import queue
+import threading
 from datetime import datetime, timedelta
+from decimal import Decimal
 from collections import defaultdict
+import ciso8601
 import psycopg
 from psycopg.types.json import Jsonb
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
 
 from settings import settings
+from export_xml import parse_export
+
+
+# COPY amortizes far better than INSERT, so flush in large batches
+BATCH_SIZE = 50_000
+
+# Parsed batches allowed to wait for the COPY writer thread (backpressure)
+WRITE_QUEUE_SIZE = 4
+
+# Binary COPY needs explicit column types; `value` is NUMERIC, so rows
+# carry a Decimal (a float has no binary numeric encoding).
+HEALTH_RECORD_COPY_SQL = """
+    COPY health_record (user_id, record_type, source, ts, value, unit)
+    FROM STDIN WITH (FORMAT BINARY)
+"""
+HEALTH_RECORD_COPY_TYPES = ["text", "text", "text", "timestamptz", "numeric", "text"]
+
+# Secondary indexes on health_record (as defined in schema.sql). They are
+# dropped for the bulk load and rebuilt afterwards: one sorted build per
+# index instead of a B-tree insert per row.
+HEALTH_RECORD_INDEXES = {
+    "idx_health_record_user_ts": "ON health_record(user_id, ts DESC)",
+    "idx_health_record_type": "ON health_record(record_type)",
+    "idx_health_record_source": "ON health_record(source)",
+}
 
 
 def parse_date(date_str: str):
     """Parse Apple Health date string."""
     try:
-        return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S %z")
+        # "2025-02-10 08:45:23 -0500" -> "2025-02-10 08:45:23-0500" for ciso8601;
+        # other ISO-8601 forms (e.g. "...T08:45:23Z") are parsed as given
+        if date_str[19:20] == " ":
+            return ciso8601.parse_datetime(date_str[:19] + date_str[20:])
+        return ciso8601.parse_datetime(date_str)
     except Exception:
         try:
             return datetime.fromisoformat(date_str)
@@ -35,227 +67,289 @@ def parse_date(date_str: str):
             return None
 
 
+def copy_health_records(conn, batch):
+    """Stream a batch into health_record with a single COPY."""
+    with conn.cursor() as cur:
+        with cur.copy(HEALTH_RECORD_COPY_SQL) as cp:
+            cp.set_types(HEALTH_RECORD_COPY_TYPES)
+            for row in batch:
+                cp.write_row(row)
+
+
+def prepare_bulk_load(conn):
+    """Set up the session and health_record for a fast bulk load."""
+    with conn.cursor() as cur:
+        # Batches are re-loadable, so skip waiting on WAL flush per commit
+        cur.execute("SET synchronous_commit = off")
+        cur.execute("SET maintenance_work_mem = '1GB'")
+        cur.execute("ALTER TABLE health_record SET (autovacuum_enabled = false)")
+        for name in HEALTH_RECORD_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+
+def finish_bulk_load(conn):
+    """Rebuild health_record indexes and restore normal settings."""
+    # Discard a failed batch (no-op after the final commit) so the
+    # rebuild can run even if the load raised.
+    conn.rollback()
+    print("Rebuilding health_record indexes...")
+    with conn.cursor() as cur:
+        # Plain CREATE INDEX: CONCURRENTLY can't run inside the transaction
+        # and is slower, and nothing else uses the table mid-migration.
+        for name, definition in HEALTH_RECORD_INDEXES.items():
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+        cur.execute("ALTER TABLE health_record RESET (autovacuum_enabled)")
+        cur.execute("ANALYZE health_record")
+        cur.execute("RESET maintenance_work_mem")
+        cur.execute("RESET synchronous_commit")
+    conn.commit()
+
+
 def load_health_records(conn, user_id, export_path):
-    """Stream-parse export.xml and insert into health_record table."""
+    """Stream-parse export.xml and bulk-load it into health_record.
+
+    Secondary indexes are dropped for the duration of the load and
+    rebuilt afterwards, even if the load fails. If the load failed, a
+    rebuild error is reported but the load's exception is the one raised.
+    """
     print(f"Loading health records from {export_path}...")
-    
-    batch = []
-    batch_size = 1000
+
+    prepare_bulk_load(conn)
+    try:
+        inserted = copy_export_records(conn, user_id, export_path)
+    except BaseException:
+        try:
+            finish_bulk_load(conn)
+        except Exception as e:
+            print(f"ERROR: Could not rebuild health_record indexes: {e}")
+            print("  Re-create them with: " + "; ".join(
+                f"CREATE INDEX IF NOT EXISTS {name} {definition}"
+                for name, definition in HEALTH_RECORD_INDEXES.items()
+            ))
+        raise
+    finish_bulk_load(conn)
+    print("✓ health_record indexes rebuilt")
+
+    print(f"✓ Loaded {inserted} health records")
+    return inserted
+
+
+def copy_export_records(conn, user_id, export_path):
+    """Parse Record elements and COPY them into health_record in batches.
+
+    Parsing (expat over the memory-mapped file) runs on this thread while
+    a writer thread COPYs finished batches, so XML parsing overlaps with
+    DB I/O. The bounded queue holds at most `WRITE_QUEUE_SIZE` batches,
+    which caps memory if the DB falls behind.
+    """
+    batches = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
     inserted = 0
-    
-    for event, elem in ET.iterparse(export_path, events=("end",)):
-        tag = elem.tag
-        
-        if tag == 'Record':
-            record_type = elem.attrib.get('type', 'unknown')
-            source = elem.attrib.get('sourceName') or elem.attrib.get('source', 'unknown')
-            start_date = elem.attrib.get('startDate')
-            value = elem.attrib.get('value')
-            unit = elem.attrib.get('unit')
-            
-            if start_date and value:
-                dt = parse_date(start_date)
-                if dt:
-                    try:
-                        batch.append((
-                            user_id,
-                            record_type,
-                            source,
-                            dt,
-                            float(value),
-                            unit
-                        ))
-                    except Exception as e:
-                        print(f"  ⚠️  Skipped record: {e}")
-            
-            if len(batch) >= batch_size:
-                with conn.cursor() as cur:
-                    cur.executemany(
-                        """
-                        INSERT INTO health_record 
-                        (user_id, record_type, source, ts, value, unit)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        """,
-                        batch
-                    )
+    failures = []
+
+    def write_batches():
+        nonlocal inserted
+        try:
+            while (batch := batches.get()) is not None:
+                copy_health_records(conn, batch)
+                conn.commit()
                 inserted += len(batch)
                 print(f"  ...inserted {inserted} records")
-                conn.commit()
-                batch.clear()
-        
-        elem.clear()
-    
-    # Final batch
-    if batch:
-        with conn.cursor() as cur:
-            cur.executemany(
-                """
-                INSERT INTO health_record 
-                (user_id, record_type, source, ts, value, unit)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                batch
-            )
-        inserted += len(batch)
-        conn.commit()
-    
-    print(f"✓ Loaded {inserted} health records")
+        except Exception as e:
+            failures.append(e)
+            # Keep draining so the parser never blocks on a full queue
+            while batches.get() is not None:
+                pass
+
+    writer = threading.Thread(target=write_batches, name="health-record-writer")
+    writer.start()
+
+    batch = []
+
+    def on_start(tag, attrs):
+        nonlocal batch
+        if tag != 'Record':
+            return
+
+        record_type = attrs.get('type', 'unknown')
+        source = attrs.get('sourceName') or attrs.get('source', 'unknown')
+        start_date = attrs.get('startDate')
+        value = attrs.get('value')
+        unit = attrs.get('unit')
+
+        if start_date and value:
+            dt = parse_date(start_date)
+            if dt:
+                try:
+                    batch.append((
+                        user_id,
+                        record_type,
+                        source,
+                        dt,
+                        # NUMERIC column: binary COPY needs a Decimal, so a
+                        # vectorized float64 decode wouldn't apply here
+                        Decimal(value),
+                        unit
+                    ))
+                except Exception as e:
+                    print(f"  ⚠️  Skipped record: {e}")
+
+        if len(batch) >= BATCH_SIZE:
+            # Stop parsing as soon as the writer has failed
+            if failures:
+                raise failures[0]
+            # Hand the list to the writer and start a fresh one
+            batches.put(batch)
+            batch = []
+
+    try:
+        parse_export(export_path, on_start)
+
+        # Final batch
+        if batch and not failures:
+            batches.put(batch)
+    finally:
+        batches.put(None)
+        writer.join()
+
+    if failures:
+        raise failures[0]
     return inserted
 
 
-def compute_daily_summaries(conn, user_id):
+def compute_daily_summaries(cur, user_id):
     """Compute daily_summary from health_record."""
     print("Computing daily summaries...")
     
-    with conn.cursor() as cur:
-        # Clear old summaries
-        cur.execute("DELETE FROM daily_summary WHERE user_id = %s", (user_id,))
-        
-        # Insert new summaries
-        cur.execute("""
-            INSERT INTO daily_summary 
-            (user_id, date, 
-             resting_hr_bpm, min_hr_bpm, max_hr_bpm, avg_hr_bpm,
-             avg_hrv_ms, steps, active_minutes, active_energy_cal,
-             stress_score, created_at)
-            SELECT
-                %s,
-                DATE(ts),
-                PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY value)
-                  FILTER (WHERE record_type LIKE '%%HeartRate%%'),
-                MIN(value) FILTER (WHERE record_type LIKE '%%HeartRate%%'),
-                MAX(value) FILTER (WHERE record_type LIKE '%%HeartRate%%'),
-                AVG(value) FILTER (WHERE record_type LIKE '%%HeartRate%%'),
-                AVG(value) FILTER (WHERE record_type LIKE '%%HRV%%' 
-                                OR record_type LIKE '%%HeartRateVariability%%'),
-                SUM(value) FILTER (WHERE record_type LIKE '%%StepCount%%'),
-                COUNT(DISTINCT DATE_TRUNC('minute', ts))::INT 
-                  FILTER (WHERE record_type LIKE '%%Active%%' 
-                          OR value > 100),
-                SUM(value) FILTER (WHERE record_type LIKE '%%ActiveEnergyBurned%%'),
-                NULL,
-                NOW()
-            FROM health_record
-            WHERE user_id = %s
-            GROUP BY DATE(ts)
-            ORDER BY DATE(ts) DESC
-        """, (user_id, user_id))
-        
-        conn.commit()
+    # Clear old summaries
+    cur.execute("DELETE FROM daily_summary WHERE user_id = %s", (user_id,))
     
-    print("✓ Daily summaries calculated")
+    # Insert new summaries
+    cur.execute("""
+        INSERT INTO daily_summary 
+        (user_id, date, 
+         resting_hr_bpm, min_hr_bpm, max_hr_bpm, avg_hr_bpm,
+         avg_hrv_ms, steps, active_minutes, active_energy_cal,
+         stress_score, created_at)
+        SELECT
+            %s,
+            DATE(ts),
+            PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY value)
+              FILTER (WHERE record_type LIKE '%%HeartRate%%'),
+            MIN(value) FILTER (WHERE record_type LIKE '%%HeartRate%%'),
+            MAX(value) FILTER (WHERE record_type LIKE '%%HeartRate%%'),
+            AVG(value) FILTER (WHERE record_type LIKE '%%HeartRate%%'),
+            AVG(value) FILTER (WHERE record_type LIKE '%%HRV%%' 
+                            OR record_type LIKE '%%HeartRateVariability%%'),
+            SUM(value) FILTER (WHERE record_type LIKE '%%StepCount%%'),
+            COUNT(DISTINCT DATE_TRUNC('minute', ts))::INT 
+              FILTER (WHERE record_type LIKE '%%Active%%' 
+                      OR value > 100),
+            SUM(value) FILTER (WHERE record_type LIKE '%%ActiveEnergyBurned%%'),
+            NULL,
+            NOW()
+        FROM health_record
+        WHERE user_id = %s
+        GROUP BY DATE(ts)
+        ORDER BY DATE(ts) DESC
+    """, (user_id, user_id))
 
 
-def compute_hr_baselines(conn, user_id):
+def compute_hr_baselines(cur, user_id):
     """Compute HR baselines (7-day rolling averages per hour/day-of-week)."""
     print("Computing HR baselines...")
     
-    with conn.cursor() as cur:
-        # Clear old baselines
-        cur.execute("DELETE FROM hr_baselines WHERE user_id = %s", (user_id,))
-        
-        # Compute and insert baselines
-        cur.execute("""
-            INSERT INTO hr_baselines
-            (user_id, hour_of_day, day_of_week, baseline_hr, baseline_std, 
-             sample_count, last_updated)
-            SELECT
-                %s,
-                EXTRACT(HOUR FROM ts)::INT,
-                EXTRACT(DOW FROM ts)::INT - 1,
-                ROUND(AVG(value)::NUMERIC, 1),
-                ROUND(STDDEV(value)::NUMERIC, 1),
-                COUNT(*),
-                NOW()
-            FROM health_record
-            WHERE user_id = %s
-                AND record_type LIKE '%%HeartRate%%'
-                AND ts >= NOW() - INTERVAL '30 days'
-            GROUP BY EXTRACT(HOUR FROM ts), EXTRACT(DOW FROM ts)
-        """, (user_id, user_id))
-        
-        conn.commit()
+    # Clear old baselines
+    cur.execute("DELETE FROM hr_baselines WHERE user_id = %s", (user_id,))
     
-    print("✓ HR baselines calculated")
+    # Compute and insert baselines
+    cur.execute("""
+        INSERT INTO hr_baselines
+        (user_id, hour_of_day, day_of_week, baseline_hr, baseline_std, 
+         sample_count, last_updated)
+        SELECT
+            %s,
+            EXTRACT(HOUR FROM ts)::INT,
+            EXTRACT(DOW FROM ts)::INT - 1,
+            ROUND(AVG(value)::NUMERIC, 1),
+            ROUND(STDDEV(value)::NUMERIC, 1),
+            COUNT(*),
+            NOW()
+        FROM health_record
+        WHERE user_id = %s
+            AND record_type LIKE '%%HeartRate%%'
+            AND ts >= NOW() - INTERVAL '30 days'
+        GROUP BY EXTRACT(HOUR FROM ts), EXTRACT(DOW FROM ts)
+    """, (user_id, user_id))
 
 
-def compute_activity_patterns(conn, user_id):
+def compute_activity_patterns(cur, user_id):
     """Compute activity patterns (time-of-day + motion type histograms)."""
     print("Computing activity patterns...")
     
-    with conn.cursor() as cur:
-        # Clear old patterns
-        cur.execute("DELETE FROM activity_patterns WHERE user_id = %s", (user_id,))
-        
-        # Compute patterns from step count / motion data
-        cur.execute("""
-            INSERT INTO activity_patterns
-            (user_id, day_of_week, hour_of_day, motion_type, frequency_count, last_updated)
-            SELECT
-                %s,
-                EXTRACT(DOW FROM ts)::INT - 1,
-                EXTRACT(HOUR FROM ts)::INT,
-                CASE 
-                    WHEN value IS NULL THEN 'unknown'
-                    WHEN value > 500 THEN 'high_activity'
-                    WHEN value > 100 THEN 'walking'
-                    ELSE 'sedentary'
-                END,
-                COUNT(*),
-                NOW()
-            FROM health_record
-            WHERE user_id = %s
-                AND (record_type LIKE '%%StepCount%%' 
-                     OR record_type LIKE '%%Motion%%'
-                     OR record_type LIKE '%%WalkingSpeed%%')
-            GROUP BY 
-                EXTRACT(DOW FROM ts),
-                EXTRACT(HOUR FROM ts),
-                CASE WHEN value IS NULL THEN 'unknown'
-                     WHEN value > 500 THEN 'high_activity'
-                     WHEN value > 100 THEN 'walking'
-                     ELSE 'sedentary' END
-        """, (user_id, user_id))
-        
-        conn.commit()
+    # Clear old patterns
+    cur.execute("DELETE FROM activity_patterns WHERE user_id = %s", (user_id,))
     
-    print("✓ Activity patterns calculated")
+    # Compute patterns from step count / motion data
+    cur.execute("""
+        INSERT INTO activity_patterns
+        (user_id, day_of_week, hour_of_day, motion_type, frequency_count, last_updated)
+        SELECT
+            %s,
+            EXTRACT(DOW FROM ts)::INT - 1,
+            EXTRACT(HOUR FROM ts)::INT,
+            CASE 
+                WHEN value IS NULL THEN 'unknown'
+                WHEN value > 500 THEN 'high_activity'
+                WHEN value > 100 THEN 'walking'
+                ELSE 'sedentary'
+            END,
+            COUNT(*),
+            NOW()
+        FROM health_record
+        WHERE user_id = %s
+            AND (record_type LIKE '%%StepCount%%' 
+                 OR record_type LIKE '%%Motion%%'
+                 OR record_type LIKE '%%WalkingSpeed%%')
+        GROUP BY 
+            EXTRACT(DOW FROM ts),
+            EXTRACT(HOUR FROM ts),
+            CASE WHEN value IS NULL THEN 'unknown'
+                 WHEN value > 500 THEN 'high_activity'
+                 WHEN value > 100 THEN 'walking'
+                 ELSE 'sedentary' END
+    """, (user_id, user_id))
 
 
-def compute_hrv_baselines(conn, user_id):
+def compute_hrv_baselines(cur, user_id):
     """Compute 30-day HRV baseline."""
     print("Computing HRV baselines...")
     
-    with conn.cursor() as cur:
-        # Clear old baselines
-        cur.execute("DELETE FROM hrv_baselines WHERE user_id = %s", (user_id,))
-        
-        # Compute 30-day rolling baseline
-        cur.execute("""
-            INSERT INTO hrv_baselines
-            (user_id, period_start_date, period_end_date,
-             baseline_hrv_30day_avg, baseline_hrv_std, z_score_threshold, last_updated)
-            SELECT
-                %s,
-                (CURRENT_DATE - INTERVAL '30 days')::DATE,
-                CURRENT_DATE,
-                ROUND(AVG(value)::NUMERIC, 2),
-                ROUND(STDDEV(value)::NUMERIC, 2),
-                2.0,  -- threshold for anomaly detection
-                NOW()
-            FROM health_record
-            WHERE user_id = %s
-                AND (record_type LIKE '%%HRV%%'
-                     OR record_type LIKE '%%HeartRateVariability%%')
-                AND ts >= NOW() - INTERVAL '30 days'
-        """, (user_id, user_id))
-        
-        conn.commit()
+    # Clear old baselines
+    cur.execute("DELETE FROM hrv_baselines WHERE user_id = %s", (user_id,))
     
-    print("✓ HRV baselines calculated")
+    # Compute 30-day rolling baseline
+    cur.execute("""
+        INSERT INTO hrv_baselines
+        (user_id, period_start_date, period_end_date,
+         baseline_hrv_30day_avg, baseline_hrv_std, z_score_threshold, last_updated)
+        SELECT
+            %s,
+            (CURRENT_DATE - INTERVAL '30 days')::DATE,
+            CURRENT_DATE,
+            ROUND(AVG(value)::NUMERIC, 2),
+            ROUND(STDDEV(value)::NUMERIC, 2),
+            2.0,  -- threshold for anomaly detection
+            NOW()
+        FROM health_record
+        WHERE user_id = %s
+            AND (record_type LIKE '%%HRV%%'
+                 OR record_type LIKE '%%HeartRateVariability%%')
+            AND ts >= NOW() - INTERVAL '30 days'
+    """, (user_id, user_id))
 
 
-def insert_device_sources(conn, user_id):
+def insert_device_sources(cur, user_id):
     """Register data sources (Apple Watch, iPhone, etc.)."""
     print("Registering device sources...")
     
@@ -266,17 +360,11 @@ def insert_device_sources(conn, user_id):
         ('Garmin', 'wearable', 'Garmin'),
     ]
     
-    with conn.cursor() as cur:
-        for device_name, device_type, source_label in sources:
-            cur.execute("""
-                INSERT INTO device_sources (user_id, device_name, device_type, source_label)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (user_id, device_name, source_label) DO NOTHING
-            """, (user_id, device_name, device_type, source_label))
-        
-        conn.commit()
-    
-    print("✓ Device sources registered")
+    cur.executemany("""
+        INSERT INTO device_sources (user_id, device_name, device_type, source_label)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id, device_name, source_label) DO NOTHING
+    """, [(user_id, *source) for source in sources])
 
 
 def main():
@@ -307,14 +395,17 @@ def main():
         # 1. Load raw data
         load_health_records(conn, user_id, export_path)
         
-        # 2. Compute aggregates
-        compute_daily_summaries(conn, user_id)
-        compute_hr_baselines(conn, user_id)
-        compute_hrv_baselines(conn, user_id)
-        compute_activity_patterns(conn, user_id)
-        
-        # 3. Register sources
-        insert_device_sources(conn, user_id)
+        # 2. Compute aggregates + 3. register sources. The statements are
+        # pipelined (one round trip instead of one per statement) and
+        # committed together once the pipeline has synced.
+        with conn.pipeline(), conn.cursor() as cur:
+            compute_daily_summaries(cur, user_id)
+            compute_hr_baselines(cur, user_id)
+            compute_hrv_baselines(cur, user_id)
+            compute_activity_patterns(cur, user_id)
+            insert_device_sources(cur, user_id)
+        conn.commit()
+        print("✓ Aggregates calculated and device sources registered")
         
         print("\n" + "=" * 80)
         print("✓ MIGRATION COMPLETE!")
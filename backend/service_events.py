@@ -7,26 +7,64 @@ perform database operations. All write paths should go through this
 service to ensure consistency and a single security chokepoint.
 
 Key responsibilities:
-- protect the system (max batch sizes)
-- validate event semantics (allowed event `type` values)
-- enforce timestamp rules (timezone-awareness + UTC normalization)
+- protect the system (max request sizes)
+- validate event semantics (allowed `type` values are enforced when
+  `EventIn` is decoded; see `models.EventType`)
+- enforce timestamp rules (timezone-awareness is enforced when `EventIn`
+  is decoded; the DB stores the UTC instant of any aware timestamp, so
+  no conversion happens here)
 - apply payload versioning
 - perform (future) permission checks using `caller_user`
+- serve repeated timeline reads from a short-lived in-process cache
 """
 
-from typing import List
-from datetime import timezone
+import time
+from itertools import islice
+from typing import Iterable, Iterator, List
+from datetime import datetime, timezone
+import orjson
+from cachetools import TTLCache
 from models import EventIn
-from repo_events import EventRepo
+from repo_events import TIMELINE_COLUMNS, EventRepo
 from settings import settings
 
 
-ALLOWED_TYPES = {
-    "context_snapshot",
-    "health_metric",
-    "workout",
-    "calendar_context",
-}
+# Timeline JSON is cached per user for this many seconds. The UI re-polls
+# the same (user_id, limit) often, and a couple of seconds of staleness is
+# fine for a human-facing timeline; writes through this service also drop
+# the user's entries immediately.
+TIMELINE_CACHE_TTL_SECONDS = 2
+TIMELINE_CACHE_MAX_USERS = 1024
+# How long a user's last write is remembered for in-flight timeline reads;
+# only needs to outlast a read. A read too slow (or overlapping too many
+# writes) to rule out a forgotten write just isn't cached.
+TIMELINE_WRITE_MEMORY_SECONDS = 60
+
+
+def _validate_and_normalize(events: List[EventIn], caller_user: str | None) -> None:
+    """Check `events` belong to `caller_user` (if set), then normalize them.
+
+    Nothing is modified unless every event passes. Event types and
+    timestamp timezones are not checked here: `EventIn` declares them, so
+    the decoder has already rejected bad values.
+    """
+
+    # (Optional security rule for later)
+    if caller_user:
+        for e in events:
+            if e.user_id != caller_user:
+                raise PermissionError("Cannot write events for another user")
+
+    # `ts` is written as-is: any aware datetime is stored as its UTC
+    # instant by the timestamptz dumper, so converting first would only
+    # allocate a copy per non-UTC event.
+    for e in events:
+        # Payload versioning (helps future migrations + backwards compat).
+        # This stays here rather than in SQL: COPY can't evaluate
+        # expressions, and staging the batch for an INSERT ... SELECT
+        # costs far more than this dict probe.
+        if "v" not in e.payload:
+            e.payload["v"] = 1
 
 
 class EventService:
@@ -35,63 +73,193 @@ class EventService:
     Example usage:
         repo = EventRepo()
         svc = EventService(repo)
-        svc.ingest_events(events, caller_user='alice')
+        await svc.ingest_events(events, caller_user='alice')
     """
 
     def __init__(self, repo: EventRepo):
         self.repo = repo
+        # Request limits, read from `settings` once instead of per call
+        self._max_batch = settings.max_batch_size
+        self._max_request = settings.max_request_size
+        self._max_timeline = settings.max_timeline_limit
+        # user_id -> {limit: timeline JSON bytes}
+        self._timeline_cache: TTLCache = TTLCache(
+            maxsize=TIMELINE_CACHE_MAX_USERS, ttl=TIMELINE_CACHE_TTL_SECONDS
+        )
+        # Sequence number of the latest committed write (any user), and
+        # user_id -> sequence number of that user's latest write. A timeline
+        # read only caches its result if no write for the user landed while
+        # it was awaiting the DB.
+        self._write_seq = 0
+        self._last_write_seq: TTLCache = TTLCache(
+            maxsize=TIMELINE_CACHE_MAX_USERS, ttl=TIMELINE_WRITE_MEMORY_SECONDS
+        )
 
-    def ingest_events(self, events: List[EventIn], caller_user: str | None = None) -> int:
+    async def ingest_events(self, events: Iterable[EventIn], caller_user: str | None = None) -> int:
         """Validate and persist a batch of events.
 
         Steps:
-        1. Quick guards (empty list, batch size limit).
-        2. Validate and normalize each `EventIn` in-place.
-        3. Delegate to `EventRepo.insert_events()` for the DB write.
+        1. Quick guards (empty input, `settings.max_request_size`).
+        2. (Event types and timestamp timezones were already validated
+           when decoding `EventIn`.)
+        3. With a `caller_user`, check that every event belongs to them.
+        4. Normalize each `EventIn` in-place (payload version).
+        5. Hand chunks of `settings.max_batch_size` events to
+           `EventRepo.insert_event_chunks()`. All chunks share one
+           transaction, so the whole request is stored or none of it is.
+
+        A list (what the HTTP route passes) is validated as a whole before
+        any DB work, so a bad request takes no connection and modifies no
+        event. Any other iterable (e.g. a generator) is consumed once,
+        validated chunk by chunk as it streams into the COPY, so only one
+        chunk needs to be resident; an invalid later chunk rolls back the
+        transaction, but earlier chunks' events have been normalized.
 
         Raises:
-        - `ValueError` for invalid inputs (bad type, missing tzinfo, too large)
+        - `ValueError` if the request is too large
         - `PermissionError` if `caller_user` attempts to write for another user
         """
 
-        # 1) protect the system
-        if len(events) == 0:
-            return 0
-        if len(events) > settings.max_batch_size:
-            raise ValueError(
-                f"Too many events in one request: {len(events)} (max {settings.max_batch_size})"
+        max_bs = self._max_batch
+        if isinstance(events, list):
+            # 1) protect the system
+            if len(events) == 0:
+                return 0
+            if len(events) > self._max_request:
+                raise ValueError(
+                    f"Too many events in one request: {len(events)} (max {self._max_request})"
+                )
+
+            # 3-4) validate, then normalize in place
+            _validate_and_normalize(events, caller_user)
+            chunks: Iterator[List[EventIn]] = (
+                events[start:start + max_bs] for start in range(0, len(events), max_bs)
             )
+        else:
+            it = iter(events)
+            # Pull the first chunk before touching the DB so an empty
+            # iterable costs nothing.
+            first = list(islice(it, max_bs))
+            if not first:
+                return 0
+            chunks = self._validated_chunks(first, it, caller_user)
 
-        # 2) validate/normalize each event
-        for e in events:
-            if e.type not in ALLOWED_TYPES:
-                raise ValueError(f"Unsupported event type: {e.type}")
+        user_ids: set[str] = set()
 
-            # Must be timezone-aware
-            if e.ts.tzinfo is None:
-                raise ValueError("Timestamp must include timezone info (e.g., 2026-02-20T10:00:00Z)")
+        def tracked(chunks: Iterator[List[EventIn]]) -> Iterator[List[EventIn]]:
+            for chunk in chunks:
+                user_ids.update(e.user_id for e in chunk)
+                yield chunk
 
-            # Normalize to UTC — repository stores timestamps as UTC.
-            e.ts = e.ts.astimezone(timezone.utc)
+        # 5) DB write via repository
+        inserted = await self.repo.insert_event_chunks(tracked(chunks))
+        for user_id in user_ids:
+            self._invalidate_timeline(user_id)
+        return inserted
 
-            # (Optional security rule for later)
-            if caller_user and e.user_id != caller_user:
-                raise PermissionError("Cannot write events for another user")
+    def _invalidate_timeline(self, user_id: str) -> None:
+        """Drop `user_id`'s cached timelines after a committed write.
+
+        Recording the write's sequence number also stops reads already in
+        flight from storing what they fetched before the write.
+        """
+
+        self._write_seq += 1
+        self._last_write_seq[user_id] = self._write_seq
+        self._timeline_cache.pop(user_id, None)
 
-            # Payload versioning (helps future migrations + backwards compat)
-            if "v" not in e.payload:
-                e.payload["v"] = 1
+    def _validated_chunks(
+        self,
+        chunk: List[EventIn],
+        rest: Iterator[EventIn],
+        caller_user: str | None,
+    ) -> Iterator[List[EventIn]]:
+        """Yield `chunk` and the following chunks of `rest`, each validated.
+
+        Raising here aborts the repo's transaction.
+        """
 
-        # 3) DB write via repository
-        return self.repo.insert_events(events)
+        max_bs = self._max_batch
+        max_rs = self._max_request
+        count = 0
+        while chunk:
+            # 1) protect the system
+            count += len(chunk)
+            if count > max_rs:
+                raise ValueError(f"Too many events in one request (max {max_rs})")
 
-    def get_timeline(self, user_id: str, limit: int) -> list[dict]:
-        """Return timeline for `user_id` capped by configured limits."""
+            # 3-4) validate, then normalize in place
+            _validate_and_normalize(chunk, caller_user)
+            yield chunk
+            chunk = list(islice(rest, max_bs))
+
+    async def seed_demo_events(self, user_id: str, start: datetime, count: int = 200) -> int:
+        """Insert `count` simulated context snapshots, 5 minutes apart from `start`.
+
+        The rows are generated by the repository in a single SQL statement,
+        so there is nothing to validate per event here beyond `start`.
+        """
+
+        if start.tzinfo is None:
+            raise ValueError("Timestamp must include timezone info (e.g., 2026-02-20T10:00:00Z)")
+        inserted = await self.repo.insert_demo_snapshots(user_id, start.astimezone(timezone.utc), count)
+        self._invalidate_timeline(user_id)
+        return inserted
+
+    async def get_timeline(self, user_id: str, limit: int) -> list[dict]:
+        """Return timeline for `user_id` capped by configured limits.
+
+        Each event is a dict keyed by `TIMELINE_COLUMNS`, with `ts` left as
+        an aware datetime.
+        """
+
+        limit = max(1, min(limit, self._max_timeline))
+        rows = await self.repo.fetch_timeline_rows(user_id, limit)
+        return [dict(zip(TIMELINE_COLUMNS, r)) for r in rows]
+
+    async def get_timeline_json(self, user_id: str, limit: int) -> bytes:
+        """Return the timeline for `user_id` as JSON bytes, briefly cached.
+
+        Within `TIMELINE_CACHE_TTL_SECONDS` a repeated request is served
+        without touching the DB or re-encoding JSON. A result is not cached
+        if a write for `user_id` committed while it was being fetched.
+        """
+
+        limit = max(1, min(limit, self._max_timeline))
+        by_limit = self._timeline_cache.get(user_id)
+        if by_limit is not None and limit in by_limit:
+            return by_limit[limit]
+
+        seq = self._write_seq
+        started = time.monotonic()
+        # Dicts are built only here, at the JSON boundary; orjson writes
+        # `ts` as an ISO-8601 string.
+        body = orjson.dumps(await self.get_timeline(user_id, limit))
+        if self._is_cacheable(user_id, seq, started):
+            # Re-read the cache: the entry may have expired while awaiting
+            self._timeline_cache.setdefault(user_id, {})[limit] = body
+        return body
+
+    def _is_cacheable(self, user_id: str, seq: int, started: float) -> bool:
+        """Whether a timeline read started at (`seq`, `started`) may be cached.
+
+        True if no write for `user_id` committed after the read started.
+        With no remembered write for the user, that is only certain if
+        none could have been forgotten since: fewer writes than the
+        memory holds, and less time than it keeps them.
+        """
 
-        limit = max(1, min(limit, settings.max_timeline_limit))
-        return self.repo.fetch_timeline(user_id, limit)
+        if self._write_seq == seq:
+            return True
+        last = self._last_write_seq.get(user_id)
+        if last is not None:
+            return last <= seq
+        return (
+            self._write_seq - seq < TIMELINE_CACHE_MAX_USERS
+            and time.monotonic() - started < TIMELINE_WRITE_MEMORY_SECONDS
+        )
 
-    def health_check(self) -> None:
+    async def health_check(self) -> None:
         """Perform a lightweight DB ping via the repository."""
 
-        self.repo.ping()
+        await self.repo.ping()
@@ -2,16 +2,22 @@
 Centralized runtime configuration for the backend.
 
 This module uses `python-dotenv` to read a local `.env` file during
-development and exposes a Pydantic `Settings` model named `settings`.
+development and exposes a frozen `Settings` dataclass instance named
+`settings`.
 
 Why this exists:
 - Keeps configuration in one place so other modules import `settings`.
 - Provides typed fields with defaults and simple validation.
 
 Environment variables used:
-- `DB_URL` — PostgreSQL connection URL used by `db.get_conn()`.
+- `DB_URL` — PostgreSQL connection URL used by `db.get_conn()` and
+    `db_async.get_async_conn()`.
 - `USER_ID` — default demo user for the `/seed` route.
-- `MAX_BATCH_SIZE` — safety limit for ingest batch sizes.
+- `MAX_BATCH_SIZE` — rows per COPY when ingesting; larger requests are
+    written in chunks of this size.
+- `MAX_REQUEST_SIZE` — hard limit on events accepted in one ingest request.
+- `MAX_REQUEST_BYTES` — hard limit on an ingest request body's size, checked
+    before decoding so oversized bodies never reach memory as events.
 - `MAX_TIMELINE_LIMIT` — maximum `limit` allowed for timeline queries.
 
 Example `.env`:
@@ -20,18 +26,28 @@ USER_ID=adithya
 
 """
 
-from pydantic import BaseModel
+from dataclasses import dataclass
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
+# Parse `.env` once per process tree: the marker is inherited by worker and
+# reloader subprocesses, whose environment already holds the values.
+# `override=False` keeps real environment variables winning over `.env`.
+if "_PULSE_DOTENV" not in os.environ:
+    load_dotenv(override=False)
+    os.environ["_PULSE_DOTENV"] = "1"
 
 
-class Settings(BaseModel):
+@dataclass(frozen=True, slots=True)
+class Settings:
     """Typed settings container.
 
     All downstream code should import `settings` from this module. Use
-    these attributes (not os.getenv) so tests can monkeypatch `settings`.
+    these attributes (not os.getenv). Fields are read-only slots, so
+    reads are cheap on hot paths; tests override values by patching the
+    module's `settings` with `dataclasses.replace(settings, ...)`.
+    Components that read a value on every call (e.g. `EventService`'s
+    limits) copy it in `__init__`, so patch before constructing them.
     """
 
     db_url: str = os.getenv(
@@ -39,6 +55,8 @@ class Settings(BaseModel):
     )
     default_user: str = os.getenv("USER_ID", "adithya")
     max_batch_size: int = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+    max_request_size: int = int(os.getenv("MAX_REQUEST_SIZE", "500000"))
+    max_request_bytes: int = int(os.getenv("MAX_REQUEST_BYTES", str(128 * 1024 * 1024)))
     max_timeline_limit: int = int(os.getenv("MAX_TIMELINE_LIMIT", "1000"))
 
 